@@ -48,14 +48,19 @@ MANDATORY ARGUMENTS:
 OPTIONAL ARGUMENTS:
 -------------------
 
-  pr {matrix|0} parameter vector(s), each column is one parameter sample
+  pr {matrix|iterable|0} parameter vector(s), each column is one parameter
+     sample (also for nested lists), or an iterable lazily yielding parameter
+     samples, optionally declaring its lower and upper parameter bounds by a
+     "bounds" attribute, which parameter centering, parameter gramians and
+     Jacobi normalization of streams require
   nf {vector|0} option flags, thirteen component vector, default all zero:
-    * centering: none(0), steady(1), last(2), mean(3), rms(4)
+    * centering: none(0), steady(1), last(2), mean(3), rms(4), or list
     * input scales: single(0), linear(1), geometric(2), log(3), sparse(4)
     * state scales: single(0), linear(1), geometric(2), log(3), sparse(4)
     * input rotations: unit(0), single(1)
     * state rotations: unit(0), single(1)
-    * normalization (only: Wc, Wo, Wx, Wy): none(0), steady(1), Jacobi(2)
+    * normalization (only: Wc, Wo, Wx, Wy): none(0), steady(1), Jacobi(2);
+      Jacobi evaluates at the parameter mean, for streams the bounds midpoint
     * state gramian variant:
       * controllability gramian type (only: Wc): regular(0), output(1)
       * observability gramian type (only: Wo, Wi): regular(0), averaged(1)
@@ -64,10 +69,11 @@ OPTIONAL ARGUMENTS:
     * parameter centering (only: Ws, Wi, Wj): none(0), linear(1), log(2)
     * parameter gramian variant:
       * averaging type (only: Ws): input-state(0), input-output(1)
-      * Schur-complement (only: Wi, Wj): approx(0), coarse(1)
+      * Schur-complement (only: Wi, Wj): approx(0), coarse(1), iterative(2)
     * cross gramian partition size (only: Wx, Wj): full(0), partitioned(<N)
     * cross gramian partition index (only: Wx, Wj): partition(>0)
-    * weighting: none(0), time-linear(1), time-squared(2), state(3), scale(4)
+    * weighting: none(0), time-linear(1), time-squared(2), state(3), scale(4),
+      or list
   ut {handle|'i'} input function: u_t = ut(t) or character:
     * "i" delta impulse input
     * "s" step input / load vector / source term
@@ -78,13 +84,54 @@ OPTIONAL ARGUMENTS:
   xs {vector|0} steady-state and nominal initial state x_0 (1 or N rows)
   um {matrix|1} input scales (1 or M rows)
   xm {matrix|1} initial-state scales (1 or N rows)
-  dp {handle|@mtimes} inner product or kernel: xy = dp(x,y)
+  dp {handle|list|@mtimes} inner product or kernel: xy = dp(x,y)
+    * diagonal: diagonal-only gramian (only: Wc, Wo, Wx, Wy, Ws, Wi),
+      accumulated in O(N) instead of O(N^2) memory; Wx still buffers the
+      input trajectories in O(N nt) per output and only saves simulations
+      by reusing them across state scale sets
+    * list of kernels: one gramian per kernel from the same trajectories
 
 RETURNS:
 --------
 
   W {matrix} Gramian Matrix (for: Wc, Wo, Wx, Wy)
   W {tuple}  [State-, Parameter-] Gramian (for: Ws, Wi, Wj)
+  W {vector} Gramian diagonal (for: dp = diagonal)
+  W {list}   Gramians for each centering, weighting and kernel, in this
+             nesting order (for: list-valued nf[0], nf[12] or dp)
+
+ADAPTIVE SAMPLING:
+------------------
+
+  Setting the module variable TOL > 0 adds parameter samples and scale sets
+  progressively and stops once the relative change of the LEAD leading
+  singular values and of their dominant subspace falls below TOL.
+  The number of samples (pairs of parameter sample and scale set) used
+  and the estimated error (0 without adaptive sampling) of the latest call
+  are reported in the module variable INFO.
+
+PIPELINED ACCUMULATION:
+-----------------------
+
+  Setting the module variable WORKERS > 0 accumulates the kernel products
+  of finished trajectories in a separate thread, while the next
+  trajectories are simulated; the products themselves use the threads of
+  the linear algebra backend. At most BUFFER trajectory pairs are queued
+  and shared trajectory buffers are double-buffered, which bounds the
+  additional memory.
+
+PERSISTENT STORE:
+-----------------
+
+  Setting the module variable CACHE to a directory stores every computed
+  gramian there as ".npy" file, addressed by a hash of the system identity
+  (the "key" attribute of f and g if present, otherwise their bytecode and
+  referenced data) and all arguments. Repeated calls return a read-only
+  memory-mapped array (or tuple or list of them), which processes can share.
+  The least recently used files are evicted beyond CACHE_SIZE bytes.
+  Calls with parameters that are not a scalar, list, tuple or array (such
+  as streams and samplers), or with referenced data that cannot be hashed
+  by content, are not stored.
 
 CITE AS:
 --------
@@ -108,7 +155,16 @@ COPYRIGHT: Christian Himpe
 For more information, see: https://gramian.de
 """
 
+import os
 import math
+import types
+import queue
+import hashlib
+import contextlib
+import functools
+import warnings
+import threading
+import itertools
 import numpy as np
 
 __version__ = "5.8"
@@ -124,11 +180,38 @@ ODE = lambda f, g, t, x0, u, p: ssp2(f, g, t, x0, u, p)  # Integrator Handle
 def emgr(f, g=None, s=None, t=None, w=None, pr=0, nf=0, ut="i", us=0.0, xs=0.0, um=1.0, xm=1.0, dp=np.dot):
     """ Compute empirical system Gramian matrix """
 
+    global INFO
+
     # Version Info
     if f == "version":
         return __version__
 
+    # Persistent Gramian Store (not for parameter streams)
+    if CACHE is not None and type(pr) in {int, float, list, tuple, np.ndarray}:
+        key = digest(__version__, ODE, TOL, LEAD, f, g, s, t, w, pr, nf, ut, us, xs, um, xm, dp)
+        if key is not None:
+            W = fetch(key)
+            if W is None:
+                W = gramian(f, g, s, t, w, pr, nf, ut, us, xs, um, xm, dp)
+                store(key, W)
+            else:
+                INFO = (0, 0.0)  # Nothing sampled
+            return W
+
+    return gramian(f, g, s, t, w, pr, nf, ut, us, xs, um, xm, dp)
+
+
+def gramian(f, g, s, t, w, pr, nf, ut, us, xs, um, xm, dp):
+    """ Empirical system Gramian computation """
+
+    global INFO
+
+    INFO = (0, 0.0)  # Reset adaptive sampling report
+
     # Default Arguments
+    if type(pr) in {list, tuple}:
+        pr = np.array(pr, dtype=float)
+
     if type(pr) in {int, float} or np.ndim(pr) == 1:
         pr = np.reshape(pr, (-1, 1))
 
@@ -143,8 +226,7 @@ def emgr(f, g=None, s=None, t=None, w=None, pr=0, nf=0, ut="i", us=0.0, xs=0.0,
     M = int(s[0])                        # Number of inputs
     N = int(s[1])                        # Number of states
     Q = int(s[2])                        # Number of outputs
-    P = pr.shape[0]                      # Dimension of parameter
-    K = pr.shape[1]                      # Number of parameter-sets
+    P, ps = psamples(pr)                 # Dimension of parameter
 
     # Time Discretization
     dt = t[0]                            # Time-step width
@@ -199,64 +281,103 @@ def emgr(f, g=None, s=None, t=None, w=None, pr=0, nf=0, ut="i", us=0.0, xs=0.0,
 ###############################################################################
 
     # Trajectory Weighting
-    if nf[12] == 1:    # Linear Time-Weighting
-        def wei(m):
-            return np.sqrt(np.linspace(0, Tf, nt))
+    def weighting(h):
+        if h == 1:    # Linear Time-Weighting
+            def wei(m):
+                return np.sqrt(np.linspace(0, Tf, nt))
 
-    elif nf[12] == 2:  # Quadratic Time-Weighting
-        def wei(m):
-            return np.linspace(0, Tf, nt) * math.sqrt(2.0)
+        elif h == 2:  # Quadratic Time-Weighting
+            def wei(m):
+                return np.linspace(0, Tf, nt) * math.sqrt(2.0)
 
-    elif nf[12] == 3:  # State-Weighting
-        def wei(m):
-            return np.linalg.norm(m, 2, axis=0)
+        elif h == 3:  # State-Weighting
+            def wei(m):
+                return np.linalg.norm(m, 2, axis=0)
 
-    elif nf[12] == 4:  # Scale-Weighting
-        def wei(m):
-            return 1.0 / np.maximum(np.spacing(1), np.linalg.norm(m, np.inf, axis=1)[:, np.newaxis])
+        elif h == 4:  # Scale-Weighting
+            def wei(m):
+                return 1.0 / np.maximum(np.spacing(1), np.linalg.norm(m, np.inf, axis=1)[:, np.newaxis])
 
-    else:              # None
-        def wei(m):
-            return 1.0
+        else:         # None
+            def wei(m):
+                return 1.0
 
-    # Trajectory Centering
-    if nf[1] == 1:    # Steady-State / Output
-        def avg(m, s):
-            return s
-
-    elif nf[1] == 2:  # Final State / Output
-        def avg(m, s):
-            return m[-1, :]
-
-    elif nf[1] == 3:  # Temporal Mean State / Output
-        def avg(m, s):
-            return np.mean(m, axis=1)
-
-    elif nf[1] == 4:  # Temporal Root-Mean-Square / Output
-        def avg(m, s):
-            return np.sqrt(np.mean(m * m, axis=1))
+        return wei
 
-    else:             # None
-        def avg(m, s):
-            return 0.0
+    # Trajectory Centering
+    def centering(d):
+        if d == 1:    # Steady-State / Output
+            def avg(m, s):
+                return np.reshape(s, (-1, 1))
+
+        elif d == 2:  # Final State / Output
+            def avg(m, s):
+                return m[:, -1:]
+
+        elif d == 3:  # Temporal Mean State / Output
+            def avg(m, s):
+                return np.mean(m, axis=1, keepdims=True)
+
+        elif d == 4:  # Temporal Root-Mean-Square / Output
+            def avg(m, s):
+                return np.sqrt(np.mean(m * m, axis=1, keepdims=True))
+
+        else:         # None
+            def avg(m, s):
+                return 0.0
+
+        return avg
+
+    # Post-Processing Variants: (centering, weighting) and kernels
+    many = type(dp) is list or type(nf[0]) is list or type(nf[12]) is list
+    CH = list(itertools.product(np.ravel(nf[0]).tolist(), np.ravel(nf[12]).tolist()))
+    VA = [(weighting(h), centering(d)) for d, h in CH]
+    DK = dp if type(dp) is list else [dp]
+    H = len(VA)  # Number of post-processing variants
+
+    def post(x, s, z):
+        """ Weighted, centered and normalized trajectory variants """
+        for wei, avg in VA:
+            y = x * wei(x)
+            y -= avg(y, s)
+            y /= z
+            yield y
+
+    def scale(W, z):
+        """ Normalized gramian (variants) """
+        for i in range(len(W)):
+            W[i] *= z
+        return W if many else W[0]
 
     # Gramian Normalization
     if nf[5]:
 
         TX = xs         # Steady-state preconditioner
 
+        if nf[5] == 2 and H > 1:  # Jacobi-type preconditioner per variant
+            W = []
+            for d, h in CH:
+                NF = list(nf)
+                NF[0] = d
+                NF[12] = h
+                G = emgr(f, g, s, t, w, pr, NF, ut, us, xs, um, xm, dp)
+                W += G if type(dp) is list else [G]
+            return W
+
         if nf[5] == 2:  # Jacobi-type preconditioner
-            NF = nf
+            NF = list(nf)
+            NF[0], NF[12] = CH[0]
             NF[5] = 0
             if w == "c" or w == "s": NF[6] = 0
             WN = w
             if w == "s": WN = 'c'
             if w == "i": WN = 'o'
             if w == "j": WN = 'x'
-            PR = np.mean(pr, axis=1)
-            def DP(x, y):
-                return np.sum(x * y.T, 1)  # Diagonal-only kernel
-            TX = np.sqrt(np.fabs(emgr(f, g, s, t, WN, PR, NF, ut, us, xs, um, xm, DP)))
+            if type(pr) is np.ndarray:
+                PR = np.mean(pr, axis=1)
+            else:  # Parameter stream
+                PR = np.mean(pbounds(pr), axis=0)
+            TX = np.sqrt(np.fabs(emgr(f, g, s, t, WN, PR, NF, ut, us, xs, um, xm, diagonal)))
 
         TX[np.fabs(TX) < np.sqrt(np.spacing(1))] = 1.0
 
@@ -277,6 +398,19 @@ def emgr(f, g=None, s=None, t=None, w=None, pr=0, nf=0, ut="i", us=0.0, xs=0.0,
 
         nf[5] = 0
 
+    # Adaptive Sampling
+    r = [0.0]  # Latest error estimate
+
+    if TOL > 0:
+        error = converge()
+
+        def done(e):
+            r[0] = error(e)
+            return r[0] < TOL
+    else:
+        def done(e):
+            return False
+
     # Non-symmetric cross Gramian and average observability Gramian
     R = 1 if nf[6] else Q
 
@@ -314,24 +448,25 @@ def emgr(f, g=None, s=None, t=None, w=None, pr=0, nf=0, ut="i", us=0.0, xs=0.0,
 
     if w == "c":  # Empirical Controllability Gramian
 
-        for k in range(K):
-            for c in range(C):
+        with accumulate(DK, H) as (put, get, spare):
+            for U, (pk, c, cp) in enumerate(sweep(ps, C), 1):
                 for m in np.nditer(np.nonzero(um[:, c])):
                     em = np.zeros(M + P)
                     em[m] = um[m, c]
                     def umc(t):
                         return up(t) + ut(t) * em[0:M]
-                    pmc = pr[:, k] + em[M:M + P]
-                    if nf[6]:
+                    pmc = pk + em[M:M + P]
+                    if nf[6]:  # Output controllability gramian
                         x = ODE(f, g, t, xs, umc, pmc)
+                        for v, x in enumerate(post(x, g(xs, us, pmc, 0), um[m, c])):
+                            put(v, x, x.T)
                     else:
                         x = ODE(f, ident, t, xs, umc, pmc)
-                    x *= wei(x)
-                    x -= avg(x, xs)
-                    x /= um[m, c]
-                    W += dp(x, x.T)
-        W *= dt / (C * K)
-        return W
+                        for v, x in enumerate(post(x, xs, um[m, c])):
+                            put(v, x, x.T)
+                if cp and done(lambda: [z * (dt / U) for z in get()]): break
+            INFO = (U, r[0])
+            return scale(get(), dt / U)
 
 ###############################################################################
 # EMPIRICAL OBSERVABILITY GRAMIAN
@@ -339,25 +474,32 @@ def emgr(f, g=None, s=None, t=None, w=None, pr=0, nf=0, ut="i", us=0.0, xs=0.0,
 
     elif w == "o":  # Empirical Observability Gramian
 
-        o = np.zeros((R * nt, A))  # Pre-allocate observability matrix
-        for k in range(K):
-            for d in range(D):
+        if dp is diagonal:  # Diagonal-only observability vectors
+            o = np.zeros((H, A))
+            DK = [lambda x, y: x]
+        else:               # Pre-allocate observability matrices
+            o = np.zeros((H, R * nt, A))
+        with accumulate(DK, H) as (put, get, spare):
+            for U, (pk, d, cp) in enumerate(sweep(ps, D), 1):
+                o = spare(o)  # Free double buffer
                 for n in np.nditer(np.nonzero(xm[:, d])):
                     en = np.zeros(N + P)
                     en[n] = xm[n, d]
                     xnd = xs + en[0:N]
-                    pnd = pr[:, k] + en[N:N + P]
+                    pnd = pk + en[N:N + P]
                     y = ODE(f, g, t, xnd, up, pnd)
-                    y *= wei(y)
-                    y -= avg(y, g(xs, us, pnd, 0))
-                    y /= xm[n, d]
-                    if nf[6]:  # Average observability gramian
-                        o[:, n] = np.sum(y, 0)
-                    else:      # Regular observability gramian
-                        o[:, n] = y.flatten(1)
-                    W += dp(o.T, o)
-            W *= dt / (D * K)
-            return W
+                    for v, y in enumerate(post(y, g(xs, us, pnd, 0), xm[n, d])):
+                        if nf[6]:  # Average observability gramian
+                            y = np.sum(y, 0)
+                        if dp is diagonal:  # Diagonal-only
+                            o[v, n] = np.vdot(y, y)
+                        else:               # Regular observability gramian
+                            o[v, :, n] = y.flatten("F")
+                for v in range(H):
+                    put(v, o[v].T, o[v])
+                if cp and done(lambda: [z * (dt / U) for z in get()]): break
+            INFO = (U, r[0])
+            return scale(get(), dt / U)
 
 ###############################################################################
 # EMPIRICAL CROSS GRAMIAN
@@ -383,22 +525,65 @@ def emgr(f, g=None, s=None, t=None, w=None, pr=0, nf=0, ut="i", us=0.0, xs=0.0,
             if ip < 0 or i0 >= i1 or i0 < 0:
                 return 0
 
-        o = np.zeros((R, nt, i1 - i0))  # Pre-allocate observability 3-tensor
-        for k in range(K):
-            for d in range(D):
+        # Diagonal-only cross gramian
+        if dp is diagonal:
+            # Input trajectories are summed over input scales once per
+            # parameter sample and paired row-wise with each output;
+            # this buffer takes O(R N nt) memory, like the full tensor
+            o = np.zeros((H, i1 - i0))  # Diagonal-only observability vectors
+            DK = [lambda x, y: x]
+            with accumulate(DK, H) as (put, get, spare):
+                pl = None
+                for U, (pk, d, cp) in enumerate(sweep(ps, D), 1):
+                    o = spare(o)  # Free double buffer
+                    if pk is not pl:
+                        pl = pk
+                        X = np.zeros((H, R, N, nt))
+                        for c in range(C):
+                            for m in np.nditer(np.nonzero(um[:, c])):
+                                em = np.zeros(M)
+                                em[m] = um[m, c]
+
+                                def umc(t):
+                                    return us + ut(t) * em
+                                x = ODE(f, ident, t, xs, umc, pk)
+                                for v, x in enumerate(post(x, xs, um[m, c])):
+                                    if nf[6]:  # Non-symmetric cross gramian
+                                        X[v, 0] += x
+                                    else:      # Regular cross gramian
+                                        X[v, m] += x
+                    for n in np.nditer(np.nonzero(xm[i0:i1, d])):
+                        en = np.zeros(N + P)
+                        en[i0 + n] = xm[i0 + n, d]
+                        xnd = xs + en[0:N]
+                        pnd = pk + en[N:N + P]
+                        y = ODE(f, g, t, xnd, up, pnd)
+                        for v, y in enumerate(post(y, g(xs, us, pnd, 0), xm[i0 + n, d])):
+                            if nf[6]:  # Non-symmetric cross gramian
+                                y = np.sum(y, axis=0)
+                            if i0 + n < N:
+                                o[v, n] = np.sum(X[v, :, i0 + n, :] * y)
+                    for v in range(H):
+                        put(v, o[v], o[v])
+                    if cp and done(lambda: [z * (dt / (C * U)) for z in get()]): break
+                INFO = (U, r[0])
+                return scale(get(), dt / (C * U))
+
+        o = np.zeros((H, R, nt, i1 - i0))  # Pre-allocate observability 3-tensors
+        with accumulate(DK, H) as (put, get, spare):
+            for U, (pk, d, cp) in enumerate(sweep(ps, D), 1):
+                o = spare(o)  # Free double buffer
                 for n in np.nditer(np.nonzero(xm[i0:i1, d])):
                     en = np.zeros(N + P)
                     en[i0 + n] = xm[i0 + n, d]
                     xnd = xs + en[0:N]
-                    pnd = pr[:, k] + en[N:N + P]
+                    pnd = pk + en[N:N + P]
                     y = ODE(f, g, t, xnd, up, pnd)
-                    y *= wei(y)
-                    y -= avg(y, g(xs, us, pnd, 0))
-                    y /= xm[i0 + n, d]
-                    if nf[6]:  # Non-symmetric cross gramian
-                        o[0, :, n] = np.sum(y, axis=0)
-                    else:      # Regular cross gramian
-                        o[:, :, n] = y
+                    for v, y in enumerate(post(y, g(xs, us, pnd, 0), xm[i0 + n, d])):
+                        if nf[6]:  # Non-symmetric cross gramian
+                            o[v, 0, :, n] = np.sum(y, axis=0)
+                        else:      # Regular cross gramian
+                            o[v, :, :, n] = y
                 for c in range(C):
                     for m in np.nditer(np.nonzero(um[:, c])):
                         em = np.zeros(M)
@@ -406,16 +591,15 @@ def emgr(f, g=None, s=None, t=None, w=None, pr=0, nf=0, ut="i", us=0.0, xs=0.0,
 
                         def umc(t):
                             return us + ut(t) * em
-                        x = ODE(f, ident, t, xs, umc, pr[:, k])
-                        x *= wei(x)
-                        x -= avg(x, xs)
-                        x /= um[m, c]
-                        if nf[6]:  # Non-symmetric cross gramian
-                            W += dp(x, o[0, :, :])
-                        else:      # Regular cross gramian
-                            W += dp(x, o[m, :, :])
-        W *= dt / (C * D * K)
-        return W
+                        x = ODE(f, ident, t, xs, umc, pk)
+                        for v, x in enumerate(post(x, xs, um[m, c])):
+                            if nf[6]:  # Non-symmetric cross gramian
+                                put(v, x, o[v, 0, :, :])
+                            else:      # Regular cross gramian
+                                put(v, x, o[v, m, :, :])
+                if cp and done(lambda: [z * (dt / (C * U)) for z in get()]): break
+            INFO = (U, r[0])
+            return scale(get(), dt / (C * U))
 
 ###############################################################################
 # EMPIRICAL LINEAR CROSS GRAMIAN
@@ -426,38 +610,38 @@ def emgr(f, g=None, s=None, t=None, w=None, pr=0, nf=0, ut="i", us=0.0, xs=0.0,
         assert M == Q or nf[6], "emgr: non-square system!"
         assert C == vm.shape[1], "emgr: scale count mismatch!"
 
-        a = Q*[None]              # Initialize adjoint cache
-        a[0] = np.zeros((N, nt))  # Pre-allocate accumulator
-        for k in range(K):
-            for c in range(C):
+        a = [Q*[None] for _ in range(H)]  # Initialize adjoint caches
+        for v in range(H):
+            a[v][0] = np.zeros((N, nt))   # Pre-allocate accumulators
+        with accumulate(DK, H) as (put, get, spare):
+            for U, (pk, c, cp) in enumerate(sweep(ps, C), 1):
+                if nf[6]:  # Free double buffer
+                    for v in range(H): a[v][0] = spare(a[v][0])
                 for q in np.nditer(np.nonzero(vm[:, c])):
                     em = np.zeros(Q)
                     em[q] = vm[q, c]
                     def vqc(t):
                         return us + ut(t) * em
-                    z = ODE(g, ident, t, xs, vqc, pr[:, k])
-                    z *= wei(z)
-                    z -= avg(z, xs)
-                    z /= vm[q, c]
-                    if nf[6]:  # Non-symmetric cross gramian
-                        a[0] += z
-                    else:      # Regular cross gramian
-                        a[q] = z
+                    z = ODE(g, ident, t, xs, vqc, pk)
+                    for v, z in enumerate(post(z, xs, vm[q, c])):
+                        if nf[6]:  # Non-symmetric cross gramian
+                            a[v][0] += z
+                        else:      # Regular cross gramian
+                            a[v][q] = z
                 for m in np.nditer(np.nonzero(um[:, c])):
                     em = np.zeros(M)
                     em[m] = um[m, c]
                     def umc(t):
                         return us + ut(t) * em
-                    x = ODE(f, ident, t, xs, umc, pr[:, k])
-                    x *= wei(x)
-                    x -= avg(x, xs)
-                    x /= um[m, c]
-                    if nf[6]:  # Non-symmetric cross gramian
-                        W += dp(x, a[0].T)
-                    else:      # Regular cross gramian
-                        W += dp(x, a[m].T)
-        W *= dt / (C * K)
-        return W
+                    x = ODE(f, ident, t, xs, umc, pk)
+                    for v, x in enumerate(post(x, xs, um[m, c])):
+                        if nf[6]:  # Non-symmetric cross gramian
+                            put(v, x, a[v][0].T)
+                        else:      # Regular cross gramian
+                            put(v, x, a[v][m].T)
+                if cp and done(lambda: [z * (dt / U) for z in get()]): break
+            INFO = (U, r[0])
+            return scale(get(), dt / U)
 
 ###############################################################################
 # EMPIRICAL SENSITIVITY GRAMIAN
@@ -468,27 +652,40 @@ def emgr(f, g=None, s=None, t=None, w=None, pr=0, nf=0, ut="i", us=0.0, xs=0.0,
         # Empirical Controllability Gramian
         pr, pm = pscales(pr, nf[8], C)
         WC = emgr(f, g, s, t, "c", pr, nf, ut, us, xs, um, xm, dp)
+        IS = [INFO]  # Adaptive sampling reports
+
+        WS = []  # Sensitivity gramians per post-processing variant
+
+        for d, h in CH:
+            NF = list(nf)
+            NF[0] = d
+            NF[12] = h
+
+            if not nf[9]:  # Input-state sensitivity gramian
+                def DP(x, y):
+                    return np.sum(x.dot(y))                # Trace pseudo-kernel
+            else:          # Input-output sensitivity gramian
+                def DP(x, y):
+                    return np.sum(np.reshape(y, (R, -1)))  # Custom pseudo-kernel
+
+                Y = emgr(f, g, s, t, "o", pr, NF, ut, us, xs, um, xm, DP)
 
-        if not nf[9]:  # Input-state sensitivity gramian
-            def DP(x, y):
-                return np.sum(x.dot(y))                # Trace pseudo-kernel
-        else:          # Input-output sensitivity gramian
-            def DP(x, y):
-                return np.sum(np.reshape(y, (R, -1)))  # Custom pseudo-kernel
+                def DP(x, y):
+                    return np.fabs(np.sum(y * Y))          # Custom pseudo-kernel
 
-            Y = emgr(f, g, s, t, "o", pr, nf, ut, us, xs, um, xm, DP)
+            WS.append(np.zeros((P, P)))  # Initialize diagonal sensitivity gramian
 
-            def DP(x, y):
-                return np.fabs(np.sum(y * Y))          # Custom pseudo-kernel
+            for p in range(P):
+                pmp = np.zeros((M + P, C))
+                pmp[M + p, 0:C] = pm[p, :]
+                WS[-1][p, p] = emgr(f, g, s, t, "c", pr, NF, ut, us, xs, pmp, xm, DP)
+                IS.append(INFO)
 
-        WS = np.zeros((P, P))  # Initialize diagonal sensitivity gramian
+        INFO = (sum(i[0] for i in IS), max(i[1] for i in IS))
 
-        for p in range(P):
-            pmp = np.zeros((M + P, C))
-            pmp[M + p, 0:C] = pm[p, :]
-            WS[p, p] = emgr(f, g, s, t, "c", pr, nf, ut, us, xs, pmp, xm, DP)
+        if not many: return WC, WS[0]
 
-        return WC, WS
+        return [(WC[i], WS[i // len(DK)]) for i in range(len(WC))]
 
 ###############################################################################
 # EMPIRICAL IDENTIFIABILTY GRAMIAN
@@ -498,18 +695,29 @@ def emgr(f, g=None, s=None, t=None, w=None, pr=0, nf=0, ut="i", us=0.0, xs=0.0,
 
         # Augmented Observability Gramian
         pr, pm = pscales(pr, nf[8], D)
-        V = emgr(f, g, s, t, "o", pr, nf, ut, us, xs, um, np.vstack((xm, pm)), dp)
+        VS = emgr(f, g, s, t, "o", pr, nf, ut, us, xs, um, np.vstack((xm, pm)), dp)
 
-        WO = V[0:N, 0:N]      # Observability Gramian
-        WM = V[0:N, N:N + P]  # Mixed Block
+        W = []
+        for V in VS if many else [VS]:
 
-        # Identifiability Gramian
-        if not nf[9]:         # Schur-complement via approximate inverse
-            WI = V[N:N + P, N:N + P] - WM.T.dot(ainv(WO)).dot(WM)
-        else:                 # Coarse Schur-complement via zero
-            WI = V[N:N + P, N:N + P]
+            if np.ndim(V) == 1:   # Diagonal-only via coarse Schur-complement
+                W.append((V[0:N], V[N:N + P]))
+                continue
 
-        return WO, WI
+            WO = V[0:N, 0:N]      # Observability Gramian
+            WM = V[0:N, N:N + P]  # Mixed Block
+
+            # Identifiability Gramian
+            if not nf[9]:         # Schur-complement via approximate inverse
+                WI = V[N:N + P, N:N + P] - WM.T.dot(ainv(WO.dot, np.diag(WO), WM))
+            elif nf[9] == 2:      # Schur-complement via iterative solve
+                WI = V[N:N + P, N:N + P] - WM.T.dot(pcg(WO.dot, np.diag(WO), WM))
+            else:                 # Coarse Schur-complement via zero
+                WI = V[N:N + P, N:N + P]
+
+            W.append((WO, WI))
+
+        return W if many else W[0]
 
 ###############################################################################
 # EMPIRICAL JOINT GRAMIAN
@@ -517,20 +725,33 @@ def emgr(f, g=None, s=None, t=None, w=None, pr=0, nf=0, ut="i", us=0.0, xs=0.0,
 
     elif w == "j":  # Empirical Joint Gramian
 
+        assert diagonal not in DK, "emgr: diagonal-only joint gramian!"
+
         # Empirical Joint Gramian
         pr, pm = pscales(pr, nf[8], D)
-        V = emgr(f, g, s, t, "x", pr, nf, ut, us, xs, um, np.vstack((xm, pm)), dp)
+        VS = emgr(f, g, s, t, "x", pr, nf, ut, us, xs, um, np.vstack((xm, pm)), dp)
+
+        if nf[10]: return VS  # Joint gramian partition
 
-        if nf[10]: return V   # Joint gramian partition
+        W = []
+        for V in VS if many else [VS]:
 
-        WX = V[0:N, 0:N]      # Cross gramian
-        WM = V[0:N, N:N + P]  # Mixed Block
+            WX = V[0:N, 0:N]      # Cross gramian
+            WM = V[0:N, N:N + P]  # Mixed Block
 
-        if not nf[9]:         # Cross-identifiability gramian
-            WI = 0.5 * WM.T.dot(ainv(WX + WX.T)).dot(WM)
-        else:                 # Coarse Schur-complement via identity
-            WI = 0.5 * WM.T.dot(WM)
-        return WX, WI
+            def WS(x):            # Symmetric part operator
+                return WX.dot(x) + WX.T.dot(x)
+
+            if not nf[9]:         # Cross-identifiability gramian
+                WI = 0.5 * WM.T.dot(ainv(WS, 2.0 * np.diag(WX), WM))
+            elif nf[9] == 2:      # Cross-identifiability gramian via iterative solve
+                WI = 0.5 * WM.T.dot(minres(WS, 2.0 * np.diag(WX), WM))
+            else:                 # Coarse Schur-complement via identity
+                WI = 0.5 * WM.T.dot(WM)
+
+            W.append((WX, WI))
+
+        return W if many else W[0]
 
     else:
         assert False, "emgr: unknown gramian type!"
@@ -558,8 +779,8 @@ def scales(nf1, nf2):
     else:
         s = np.array([1.0], ndmin=1)
 
-    if nf2 == 0:
-        s = np.concatenate((-s, s))
+    if nf2 == 0:  # Interleaved for progressive sampling
+        s = np.ravel(np.column_stack((-s, s)))
 
     return s
 
@@ -571,10 +792,7 @@ def scales(nf1, nf2):
 def pscales(p, d, c):
     """ Parameter perturbation scales """
 
-    assert p.shape[1] >= 2, "emgr: min and max parameter requires!"
-
-    pmin = np.amin(p, axis=1)
-    pmax = np.amax(p, axis=1)
+    pmin, pmax = pbounds(p)
 
     if d == 1:    # Linear centering and scales
         pr = 0.5 * (pmax + pmin)
@@ -592,6 +810,193 @@ def pscales(p, d, c):
 
     return pr, pm
 
+###############################################################################
+# LOCAL FUNCTION: psamples
+###############################################################################
+
+
+def psamples(p):
+    """ Parameter dimension and lazy parameter sample stream """
+
+    if type(p) is np.ndarray:  # Dense parameter matrix
+        return p.shape[0], iter(p.T)
+
+    s = (np.ravel(q) for q in p)
+
+    if hasattr(p, "bounds"):   # Declared dimension
+        return np.size(p.bounds[0]), s
+
+    q = next(s, None)          # Peek dimension
+    assert q is not None, "emgr: empty parameter stream!"
+    return q.size, itertools.chain((q,), s)
+
+###############################################################################
+# LOCAL FUNCTION: pbounds
+###############################################################################
+
+
+def pbounds(p):
+    """ Lower and upper parameter bounds """
+
+    if type(p) is np.ndarray:  # Dense parameter matrix
+        assert p.shape[1] >= 2, "emgr: min and max parameter required!"
+        return np.amin(p, axis=1), np.amax(p, axis=1)
+
+    assert hasattr(p, "bounds"), "emgr: parameter bounds required!"
+    return np.ravel(p.bounds[0]), np.ravel(p.bounds[1])
+
+###############################################################################
+# LOCAL FUNCTION: sweep
+###############################################################################
+
+
+def sweep(ps, n):
+    """ Lazy sweep over parameter samples and scale sets with checkpoints """
+
+    # Single parameter samples are checked per scale set, otherwise per sample
+    ps = iter(ps)
+    p = next(ps, None)
+    assert p is not None, "emgr: empty parameter stream!"
+    q = next(ps, None)
+    single = q is None
+    while p is not None:
+        for i in range(n):
+            yield p, i, single or i == n - 1
+        p, q = q, next(ps, None)
+
+###############################################################################
+# LOCAL FUNCTION: accumulate
+###############################################################################
+
+
+WORKERS = 0  # Configurable pipelined accumulation (0: off, >0: one thread)
+BUFFER = 4   # Configurable number of queued trajectory pairs
+
+
+@contextlib.contextmanager
+def accumulate(dp, n):
+    """ Sequential or pipelined accumulation of kernels for n variants """
+
+    k = len(dp)
+    S = [0.0] * (n * k)  # Gramian accumulators
+
+    def add(v, x, y):  # Every kernel from one trajectory pair
+        for i in range(k):
+            S[v * k + i] += dp[i](x, y)
+
+    if WORKERS < 1:
+        def get():
+            return S
+
+        def spare(a):
+            return a
+
+        yield add, get, spare
+        return
+
+    # Pipelined: one thread accumulates trajectory pairs from a bounded
+    # queue, while the calling thread simulates the next trajectories
+    q = queue.Queue(BUFFER)
+    E = []        # Accumulation exceptions
+    C = [0, 0]    # Numbers of queued and accumulated pairs
+    c = threading.Condition()
+    stop = threading.Event()
+
+    def work():
+        while True:
+            a = q.get()
+            if a is None: return
+            try:
+                if not E and not stop.is_set(): add(*a)
+            except Exception as e:
+                E.append(e)
+            with c:
+                C[1] += 1
+                c.notify_all()
+
+    def sync(m):  # Wait for the first m queued pairs
+        with c:
+            c.wait_for(lambda: C[1] >= m)
+        if E: raise E[0]
+
+    def put(v, x, y):
+        if E: raise E[0]
+        q.put((v, x, y))
+        C[0] += 1
+
+    def get():
+        sync(C[0])
+        return S
+
+    B = {}  # Double buffers: alternate buffer and pairs queued until swap
+
+    def spare(a):  # Swap a buffer referenced by queued pairs for a free copy
+        b, m = B.pop(id(a), (None, 0))
+        if b is None: b = np.empty_like(a)
+        sync(m)
+        b[...] = a
+        B[id(b)] = (a, C[0])
+        return b
+
+    h = threading.Thread(target=work, daemon=True)
+    h.start()
+    try:
+        yield put, get, spare
+    finally:  # Always stop the thread, also after failed simulations
+        stop.set()
+        q.put(None)
+        h.join()
+
+###############################################################################
+# LOCAL FUNCTION: converge
+###############################################################################
+
+
+TOL = 0.0         # Configurable tolerance for adaptive sampling (0: off)
+LEAD = 4          # Configurable number of monitored leading singular values
+INFO = (0, 0.0)   # Adaptive sampling report: (samples used, error estimate)
+
+
+def converge():
+    """ Convergence monitor for adaptive sampling """
+
+    # Based on subspace iteration: V = orth(W' W V), warm-started per sample
+    LAST = {}
+
+    def error(e):
+        r = 0.0
+        for i, W in enumerate(e()):  # Largest error over all variants
+            last = LAST.setdefault(i, {})
+            if np.ndim(W) < 2:  # Pseudo-kernel
+                ei = np.linalg.norm(W - last.get("W", np.inf)) / max(np.linalg.norm(W), np.spacing(1))
+                last["W"] = np.copy(W)
+            else:               # Leading singular values and dominant subspace
+                if "V" not in last:
+                    k = min(LEAD, *np.shape(W))
+                    last["V"] = np.linalg.qr(np.random.RandomState(1009).standard_normal((W.shape[1], k)))[0]
+                    last["s"] = np.full(k, np.inf)
+                V, s, _ = np.linalg.svd(W.T.dot(W.dot(last["V"])), full_matrices=False)
+                s = np.sqrt(s)
+                ei = max(np.amax(np.fabs(s - last["s"])) / max(s[0], np.spacing(1)),
+                         np.linalg.norm(last["V"] - V.dot(V.T.dot(last["V"])), 2))
+                last["V"] = V
+                last["s"] = s
+            r = max(r, ei)
+
+        return r
+
+    return error
+
+###############################################################################
+# LOCAL FUNCTION: diagonal
+###############################################################################
+
+
+def diagonal(x, y):
+    """ Diagonal-only pseudo-kernel """
+
+    return np.sum(x * y.T, 1)
+
 ###############################################################################
 # LOCAL FUNCTION: ident
 ###############################################################################
@@ -607,18 +1012,314 @@ def ident(x, u, p, t):
 ###############################################################################
 
 
-def ainv(m):
-    """ Quadratic complexity approximate inverse matrix """
+def ainv(a, m, b):
+    """ Quadratic complexity approximate inverse operator applied to columns """
 
     # Based on truncated Neumann series: X = D^-1 - D^-1 (M - D) D^-1
-    d = np.copy(np.diag(m))
+    d = np.copy(m)
     k = np.nonzero(np.fabs(d) > np.sqrt(np.spacing(1)))
     d[k] = 1.0 / d[k]
-    x = m * (-d)
-    x *= d.T
-    x.flat[::np.size(d) + 1] = d
+    y = d[:, np.newaxis] * b
+    z = a(y) - m[:, np.newaxis] * y
+    z *= d[:, np.newaxis]
+    return y - z
+
+###############################################################################
+# LOCAL FUNCTION: pcg
+###############################################################################
+
+
+def pcg(a, m, b):
+    """ Jacobi-preconditioned conjugate gradients for multiple columns """
+
+    # Requires a symmetric positive (semi-)definite operator
+    tol = np.sqrt(np.spacing(1))
+    d = np.ones(np.size(m))
+    k = np.nonzero(np.fabs(m) > tol)
+    d[k] = 1.0 / m[k]
+    d = d[:, np.newaxis]
+
+    x = np.zeros(b.shape)
+    r = np.array(b, dtype=float)
+    z = d * r
+    p = np.copy(z)
+    rz = np.sum(r * z, 0)
+    nb = tol * np.linalg.norm(b, axis=0)
+    c = np.linalg.norm(r, axis=0) > nb      # Active columns
+    for _ in range(2 * b.shape[0]):      # Allow for loss of orthogonality
+        if not np.any(c): break
+        q = a(p)
+        pq = np.sum(p * q, 0)
+        c &= pq > 0                         # Breakdown stops column
+        al = np.zeros(rz.shape)
+        al[c] = rz[c] / pq[c]
+        x += al * p
+        r -= al * q
+        z = d * r
+        rn = np.sum(r * z, 0)
+        be = np.zeros(rz.shape)
+        be[c] = rn[c] / rz[c]
+        p = z + be * p
+        rz = rn
+        c &= np.linalg.norm(r, axis=0) > nb
+
+    residual(a, b, x, nb)
     return x
 
+###############################################################################
+# LOCAL FUNCTION: minres
+###############################################################################
+
+
+def minres(a, m, b):
+    """ Preconditioned minimal residual method for multiple columns """
+
+    # For symmetric indefinite operators, with positive preconditioner |m|
+    tol = np.sqrt(np.spacing(1))
+    d = np.ones(np.size(m))
+    k = np.nonzero(np.fabs(m) > tol)
+    d[k] = 1.0 / np.fabs(m[k])
+    d = d[:, np.newaxis]
+
+    def div(x, y):
+        return np.divide(x, y, out=np.zeros(np.shape(y)), where=y > 0)
+
+    n = b.shape[1]
+    x = np.zeros(b.shape)
+    w = np.zeros(b.shape)
+    w2 = np.zeros(b.shape)
+    r1 = np.array(b, dtype=float)
+    r2 = np.copy(r1)
+    y = d * r1
+    beta = np.sqrt(np.fabs(np.sum(r1 * y, 0)))
+    oldb = np.zeros(n)
+    phibar = np.copy(beta)
+    nb = tol * beta
+    dbar = np.zeros(n)
+    epsln = np.zeros(n)
+    cs = -np.ones(n)
+    sn = np.zeros(n)
+    c = beta > 0                            # Active columns
+    for _ in range(2 * b.shape[0]):      # Allow for loss of orthogonality
+        if not np.any(c): break
+        v = div(1.0, beta) * c * y
+        y = a(v) - div(beta, oldb) * r1
+        al = np.sum(v * y, 0)
+        y -= div(al, beta) * r2
+        r1 = r2
+        r2 = y
+        y = d * r2
+        oldb = beta
+        beta = np.sqrt(np.fabs(np.sum(r2 * y, 0)))
+        oldeps = epsln
+        delta = cs * dbar + sn * al
+        gbar = sn * dbar - cs * al
+        epsln = sn * beta
+        dbar = -cs * beta
+        gamma = np.maximum(np.hypot(gbar, beta), np.spacing(1))
+        cs = gbar / gamma
+        sn = beta / gamma
+        phi = cs * phibar * c
+        phibar = sn * phibar
+        w1 = w2
+        w2 = w
+        w = (v - oldeps * w1 - delta * w2) / gamma
+        x += phi * w
+        c &= beta > 0
+        if np.any(c & (phibar <= nb)):      # Confirm by true residual
+            c &= np.linalg.norm(b - a(x), axis=0) > tol * np.linalg.norm(b, axis=0)
+
+    residual(a, b, x, tol * np.linalg.norm(b, axis=0))
+    return x
+
+###############################################################################
+# LOCAL FUNCTION: residual
+###############################################################################
+
+
+def residual(a, b, x, tol):
+    """ Final residual check of iterative solves """
+
+    if np.any(np.linalg.norm(b - a(x), axis=0) > tol):
+        warnings.warn("emgr: iterative solve did not converge!")
+
+###############################################################################
+# LOCAL FUNCTION: digest
+###############################################################################
+
+
+def digest(*a):
+    """ Content hash of system identity and arguments """
+
+    h = hashlib.sha256()
+    seen = set()
+
+    def once(x):  # Guard against reference cycles
+        if id(x) in seen: return False
+        seen.add(id(x))
+        return True
+
+    def put(x):
+        if x is None or type(x) in {bool, int, float, complex, str, bytes, slice, type(Ellipsis)}:
+            h.update(repr(x).encode())
+        elif isinstance(x, (np.ndarray, np.generic)):
+            h.update((str(x.dtype) + str(np.shape(x))).encode())
+            h.update(np.ascontiguousarray(x).tobytes())
+        elif type(x) in {list, tuple}:
+            h.update(b"(")
+            for y in x: put(y)
+            h.update(b")")
+        elif type(x) is dict:
+            h.update(b"{")
+            for k in sorted(x, key=repr):
+                put(k)
+                put(x[k])
+            h.update(b"}")
+        elif type(x) in {set, frozenset}:
+            h.update(b"{")
+            for y in sorted(x, key=repr): put(y)
+            h.update(b"}")
+        elif hasattr(x, "key"):                  # User-provided identity
+            put(x.key)
+        elif type(x) is types.ModuleType:
+            h.update(x.__name__.encode())
+        elif type(x) is types.CodeType:
+            h.update(x.co_code)
+            put(x.co_names)
+            for y in x.co_consts: put(y)
+        elif type(x) is types.FunctionType:      # Bytecode and referenced data
+            h.update(x.__qualname__.encode())
+            if not once(x): return
+            put(x.__code__)
+            put(x.__defaults__)
+            put(x.__kwdefaults__)
+            for c in x.__closure__ or ():
+                put(c.cell_contents)
+            for n in x.__code__.co_names:
+                if n in x.__globals__: put(x.__globals__[n])
+        elif type(x) is types.MethodType:        # Bound method and instance
+            put(x.__func__)
+            put(x.__self__)
+        elif type(x) is functools.partial:
+            put(x.func)
+            put(x.args)
+            put(x.keywords)
+        elif type(x) in {staticmethod, classmethod}:
+            put(x.__func__)
+        elif type(x) is property:
+            put((x.fget, x.fset, x.fdel))
+        elif hasattr(x, "__next__") or hasattr(x, "bounds"):  # Parameter stream
+            raise TypeError
+        elif isinstance(x, type) and x.__flags__ & 512:       # Python class
+            h.update(x.__qualname__.encode())
+            if not once(x): return
+            for c in x.__mro__:
+                if c.__flags__ & 512:
+                    for n, y in sorted(vars(c).items()):
+                        if n not in {"__dict__", "__weakref__", "__doc__"}:
+                            put(n)
+                            put(y)
+        elif type(x).__flags__ & 512 and hasattr(x, "__dict__"):  # Instance
+            put(type(x))
+            if not once(x): return
+            put(vars(x))
+        elif callable(x) and hasattr(x, "__qualname__"):  # Built-in functions
+            h.update((str(getattr(x, "__module__", "")) + x.__qualname__).encode())
+        else:                                    # Unknown content
+            raise TypeError
+
+    try:
+        for x in a: put(x)
+    except TypeError:
+        return None
+
+    return h.hexdigest()
+
+###############################################################################
+# LOCAL FUNCTION: fetch
+###############################################################################
+
+
+CACHE = None          # Configurable directory of persistent gramian store
+CACHE_SIZE = 2 ** 32  # Configurable size limit of persistent gramian store
+
+
+def fetch(key):
+    """ Memory-mapped gramian from persistent store """
+
+    p = os.path.join(CACHE, key)
+
+    def load(n):
+        os.utime(n)
+        return np.load(n, mmap_mode="r")
+
+    try:
+        if os.path.isfile(p + ".npy"):
+            return load(p + ".npy")
+
+        if os.path.isfile(p + ".0.npy"):
+            return tuple(load(p + ".%d.npy" % i) for i in range(2))
+
+        if os.path.isfile(p + ".list.npy"):  # Gramian variants
+            W = []
+            for i, n in enumerate(load(p + ".list.npy")):
+                q = "%s.l%d" % (p, i)
+                W.append(tuple(load(q + ".%d.npy" % j) for j in range(n)) if n else load(q + ".npy"))
+            return W
+
+    except OSError:  # Concurrently evicted
+        pass
+
+    return None
+
+###############################################################################
+# LOCAL FUNCTION: store
+###############################################################################
+
+
+def store(key, W):
+    """ Save gramian to persistent store and evict least recently used """
+
+    os.makedirs(CACHE, exist_ok=True)
+    p = os.path.join(CACHE, key)
+
+    def files(q, W):  # Gramian or gramian tuple
+        if type(W) is tuple:
+            return [(q + ".%d.npy" % i, W[i]) for i in range(len(W))]
+        return [(q + ".npy", W)]
+
+    if type(W) is list:  # Gramian variants, element-wise and index last
+        F = []
+        for i, w in enumerate(W):
+            F += files("%s.l%d" % (p, i), w)
+        F.append((p + ".list.npy", [len(w) if type(w) is tuple else 0 for w in W]))
+    else:
+        F = files(p, W)
+
+    for n, w in F:  # Atomic replacement for concurrent processes
+        tmp = "%s.%d.tmp" % (n, os.getpid())
+        with open(tmp, "wb") as h:
+            np.save(h, np.asarray(w))
+        os.replace(tmp, n)
+
+    E = []
+    for e in os.scandir(CACHE):
+        if e.name.endswith(".npy"):
+            try:
+                st = e.stat()
+                E.append((st.st_mtime, st.st_size, e.path))
+            except OSError:
+                pass
+
+    z = sum(e[1] for e in E)
+    for _, b, n in sorted(E):
+        if z <= CACHE_SIZE: break
+        try:
+            os.remove(n)
+        except OSError:
+            pass
+        z -= b
+
 ###############################################################################
 # LOCAL FUNCTION: ssp2
 ###############################################################################
@@ -649,6 +1350,6 @@ def ssp2(f, g, t, x0, u, p):
         xk2 /= STAGES
         xk2 += xk1 * ((STAGES - 1.0) / STAGES)
         xk1 = np.copy(xk2)
-        y[:, k] = g(xk1, uk, p, tk).flatten(1)
+        y[:, k] = g(xk1, uk, p, tk).flatten()
 
     return y
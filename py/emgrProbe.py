@@ -65,21 +65,25 @@ def emgrProbe():
 
         K = H if w == "y" else G
 
+        # Centering, weighting and kernels share one set of trajectories
+        d = centering
+        h = weighting
+        i = kernels
+
         for c in training:
-            for d in centering:
-                for e in normalization:
-                    for f in stype:
-                        for g in extra:
-                            for h in weighting:
-                                for i in kernels:
-
-                                    if w in ["s", "i", "j"]:
-
-                                        for j in ptype:
-                                            for k in pcentering:
-                                                W.append(np.linalg.svd(emgr(F, K, [M, N, Q], [dt, Tf], w, q, [d, 0, 0, 0, 0, e, f, g, 0, j, k, 0, h], c, 0.0, 0.0, 1.0, 1.0, i)[1], compute_uv=False))
-                                    else:
-                                        W.append(np.linalg.svd(emgr(F, K, [M, N, Q], [dt, Tf], w, p, [d, 0, 0, 0, 0, e, f, g, 0, 0, 0, 0, h], c, 0.0, 0.0, 1.0, 1.0, i), compute_uv=False))
+            for e in normalization:
+                for f in stype:
+                    for g in extra:
+
+                        if w in ["s", "i", "j"]:
+
+                            for j in ptype:
+                                for k in pcentering:
+                                    for V in emgr(F, K, [M, N, Q], [dt, Tf], w, q, [d, 0, 0, 0, 0, e, f, g, 0, j, k, 0, h], c, 0.0, 0.0, 1.0, 1.0, i):
+                                        W.append(np.linalg.svd(V[1], compute_uv=False))
+                        else:
+                            for V in emgr(F, K, [M, N, Q], [dt, Tf], w, p, [d, 0, 0, 0, 0, e, f, g, 0, 0, 0, 0, h], c, 0.0, 0.0, 1.0, 1.0, i):
+                                W.append(np.linalg.svd(V, compute_uv=False))
 
         print(w)
         z += 1
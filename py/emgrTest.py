@@ -0,0 +1,141 @@
+"""
+  project: emgr ( https://gramian.de )
+  version: 5.8.py (2020-05-01)
+  authors: Christian Himpe (0000-0003-2194-6754)
+  license: BSD-2-Clause License (opensource.org/licenses/BSD-2-Clause)
+  summary: emgrTest (emgr configuration test script)
+"""
+
+import os
+import shutil
+import tempfile
+import numpy as np
+import emgr as em
+from emgr import emgr
+
+
+M = 4
+N = 16
+
+A = -2.0 * np.eye(N) + np.eye(N, k=1) + np.eye(N, k=-1)
+A[0, 0] = -1.0
+B = np.outer(np.arange(N) == 0, np.linspace(1.0 / M, 1.0, M))
+C = B.T
+
+def f(x,u,p,t): return A.dot(x) + B.dot(u) + p
+def g(x,u,p,t): return C.dot(x)
+def h(x,u,p,t): return A.T.dot(x) + C.T.dot(u)
+
+s = (M, N, M)
+t = (0.01, 1.0)
+P = np.zeros((N, 2))
+P[:, 1] = 0.1
+
+
+class Stream:
+    """ Parameter stream with declared bounds """
+
+    def __init__(self, p):
+        self.p = p
+        self.bounds = (np.amin(p, axis=1), np.amax(p, axis=1))
+
+    def __iter__(self):
+        return iter(self.p.T)
+
+
+# Streamed parameters
+for w in "coxy":
+    assert np.allclose(emgr(f, h if w == "y" else g, s, t, w, iter(P.T)),
+                       emgr(f, h if w == "y" else g, s, t, w, P))
+
+for w in "sij":
+    for a, b in zip(emgr(f, g, s, t, w, Stream(P)), emgr(f, g, s, t, w, P)):
+        assert np.allclose(a, b)
+
+assert np.allclose(emgr(f, g, s, t, "c", Stream(P), [0, 0, 0, 0, 0, 2]),
+                   emgr(f, g, s, t, "c", P, [0, 0, 0, 0, 0, 2]))
+
+assert np.allclose(emgr(f, g, s, t, "c", P.tolist()), emgr(f, g, s, t, "c", P))
+
+E = Stream(P)
+E.p = np.zeros((N, 0))
+for p in [iter([]), E]:
+    try:
+        emgr(f, g, s, t, "c", p)
+        assert False
+    except AssertionError as e:
+        assert str(e) == "emgr: empty parameter stream!"
+
+# Diagonal-only gramians
+for w in "coxy":
+    for v in [0, 1]:
+        assert np.allclose(emgr(f, h if w == "y" else g, s, t, w, P, [0, 0, 0, 0, 0, 0, v], dp=em.diagonal),
+                           np.diag(emgr(f, h if w == "y" else g, s, t, w, P, [0, 0, 0, 0, 0, 0, v])))
+
+for w in "si":
+    a = emgr(f, g, s, t, w, P, dp=em.diagonal)
+    b = emgr(f, g, s, t, w, P)
+    assert np.allclose(a[0], np.diag(b[0]))
+
+a = emgr(f, g, s, t, "i", P, dp=em.diagonal)
+b = emgr(f, g, s, t, "i", P, [0, 0, 0, 0, 0, 0, 0, 0, 0, 1])
+assert np.allclose(a[1], np.diag(b[1]))
+
+# Kernel lists
+for w in "csi":
+    a = emgr(f, g, s, t, w, P, dp=[np.dot, em.diagonal])
+    b = [emgr(f, g, s, t, w, P), emgr(f, g, s, t, w, P, dp=em.diagonal)]
+    for x, y in zip(a, b):
+        for z in zip(x, y) if w in "si" else [(x, y)]:
+            assert np.allclose(*z)
+
+try:
+    emgr(f, g, s, t, "j", P, dp=[np.dot, em.diagonal])
+    assert False
+except AssertionError as e:
+    assert str(e) == "emgr: diagonal-only joint gramian!"
+
+# Pipelined accumulation
+xm = np.ones((N, 4))
+um = np.ones((M, 4))
+for d in range(1, 4):
+    xm[d, d] = 0.0
+    um[d, d] = 0.0
+
+for w in "coxy":
+    for v in [0, 1]:
+        a = [emgr(f, h if w == "y" else g, s, t, w, P, [0, 0, 0, 0, 0, 0, v],
+                  um=um if w != "y" else 1.0, xm=xm if w != "y" else 1.0) for em.WORKERS in [0, 1]]
+        assert np.allclose(a[0], a[1]), w
+
+em.WORKERS = 0
+
+# Persistent gramian store
+em.CACHE = tempfile.mkdtemp()
+try:
+    for w in "ci":
+        a = emgr(f, g, s, t, w, P)
+        n = len(os.listdir(em.CACHE))
+        b = emgr(f, g, s, t, w, P)
+        assert n > 0 and len(os.listdir(em.CACHE)) == n
+        assert np.allclose(a, b) if w == "c" else all(np.allclose(x, y) for x, y in zip(a, b))
+        assert isinstance(b if w == "c" else b[0], np.memmap)
+
+    D = {"A": np.copy(A)}
+    def k(x,u,p,t): return D["A"].dot(x) + B.dot(u)
+    a = np.array(emgr(k, g, s, t, "c"))
+    D["A"][N // 2, N // 2] = -4.0
+    assert not np.allclose(a, emgr(k, g, s, t, "c"))
+
+    class Sampler:
+        def __iter__(self):
+            return (0.1 * np.random.rand(N) for _ in range(2))
+
+    n = len(os.listdir(em.CACHE))
+    emgr(f, g, s, t, "c", Sampler())
+    assert len(os.listdir(em.CACHE)) == n
+finally:
+    shutil.rmtree(em.CACHE)
+    em.CACHE = None
+
+print("emgrTest: passed")
@@ -0,0 +1,141 @@
+"""
+  project: emgr ( https://gramian.de )
+  version: 5.8.py (2020-05-01)
+  authors: Christian Himpe (0000-0003-2194-6754)
+  license: BSD-2-Clause License (opensource.org/licenses/BSD-2-Clause)
+  summary: est - empirical system theory (reduced order model assessment)
+
+USAGE:
+------
+
+  o, e = assess(f,g,s,t,XL,XR,[pr],[us],[xs],[x0],[ut],[orders],[batch])
+  m = morscore(o,e)
+
+DESCRIPTION:
+------------
+
+  Batched evaluation of projection-based reduced order models, for example
+  with bases from balanced truncation of emgr gramians: Reduced state
+  x = xs + XL[:, :n] z, reduced vector field z' = XR[:, :n]' f(x,u,p,t).
+  All trial orders n and all test cases (test inputs times parameter
+  columns) are integrated jointly as one batch; each order uses the
+  leading n columns of the nested bases via a mask on the largest order.
+  The full order reference is integrated as one batch as well.
+  The returned output errors in the L1, L2, Linf and L0 time-series norms
+  are accumulated over all test cases and, as in est.m, normalized by the
+  largest error per norm.
+
+  With batch=True, f and g have to accept column-wise stacked states,
+  inputs and parameters (x: N x B, u: M x B, p: P x B), which holds for
+  typical matrix-vector expressions; otherwise f and g are evaluated per
+  column within the single batched integration.
+"""
+
+import math
+import numpy as np
+import emgr
+
+
+def assess(f, g, s, t, XL, XR, pr=0, us=0.0, xs=0.0, x0=0.0, ut=None, orders=None, batch=True):
+    """ Batched reduced order model error assessment """
+
+    M = int(s[0])                             # Number of inputs
+    N = int(s[1])                             # Number of states
+    nt = int(math.floor(t[1] / t[0]) + 1)     # Number of time-steps
+
+    if type(pr) in {int, float} or np.ndim(pr) == 1:
+        pr = np.reshape(pr, (-1, 1))
+
+    if type(us) in {int, float}: us = np.full(M, us)
+    if type(xs) in {int, float}: xs = np.full(N, xs)
+    if type(x0) in {int, float}: x0 = np.full(N, x0)
+
+    # Default test input: seeded pseudo-random signal
+    if ut is None:
+        ur = np.random.RandomState(1009).rand(nt)
+        dt = t[0]
+
+        def ut(t):
+            return ur[int(math.floor(t / dt))]
+
+    U = ut if type(ut) is list else [ut]      # Test inputs
+
+    # Trial orders
+    if orders is None:
+        orders = range(1, min(XL.shape[0] - 1, XL.shape[1]) + 1)
+    orders = np.array(orders, dtype=int)
+
+    T = len(U) * pr.shape[1]                  # Number of test cases
+    R = int(np.amax(orders))                  # Largest trial order
+    XL = XL[:, 0:R]
+    XR = XR[:, 0:R]
+
+    # Test case (input, parameter) per batch column
+    def inputs(n):
+        def u(t):
+            return np.tile(np.column_stack([us + ui(t) for ui in U for _ in range(pr.shape[1])]), n)
+        return u
+
+    pt = np.tile(pr, len(U))
+
+    if batch:
+        F = f
+        G = g
+    else:
+        def F(x, u, p, t):
+            return np.column_stack([f(x[:, b], u[:, b], p[:, b], t) for b in range(x.shape[1])])
+
+        def G(x, u, p, t):
+            return np.column_stack([g(x[:, b], u[:, b], p[:, b], t) for b in range(x.shape[1])])
+
+    # Full order reference (batch over test cases)
+    def FF(x, u, p, t):
+        return np.ravel(F(np.reshape(x, (N, T)), u, p, t))
+
+    def GF(x, u, p, t):
+        return np.ravel(G(np.reshape(x, (N, T)), u, p, t))
+
+    Y = emgr.ODE(FF, GF, t, np.ravel(np.tile(x0[:, np.newaxis], T)), inputs(1), pt)
+    Y = np.reshape(Y, (-1, T, nt))
+
+    # Reduced order models (batch over trial orders and test cases)
+    B = orders.size * T
+    mask = (np.arange(R)[:, np.newaxis] < np.repeat(orders, T)[np.newaxis, :]).astype(float)
+    pb = np.tile(pt, orders.size)
+
+    def FR(z, u, p, t):
+        x = xs[:, np.newaxis] + XL.dot(np.reshape(z, (R, B)))
+        return np.ravel(mask * XR.T.dot(F(x, u, p, t)))
+
+    def GR(z, u, p, t):
+        x = xs[:, np.newaxis] + XL.dot(np.reshape(z, (R, B)))
+        return np.ravel(G(x, u, p, t))
+
+    z0 = mask * XR.T.dot(x0 - xs)[:, np.newaxis]
+    y = emgr.ODE(FR, GR, t, np.ravel(z0), inputs(orders.size), pb)
+    y = np.reshape(y, (-1, orders.size, T, nt))
+
+    # Time series norms
+    norms = [lambda e: t[0] * np.sum(np.fabs(e)),                                    # L1
+             lambda e: math.sqrt(t[0]) * np.linalg.norm(e),                           # L2
+             lambda e: np.amax(np.fabs(e)),                                           # Linf
+             lambda e: np.sum(np.fabs(np.prod(e, axis=0)) ** (1.0 / e.shape[0]))]     # L0
+
+    E = np.zeros((len(norms), orders.size))
+    for j in range(T):
+        for m, n in enumerate(norms):
+            for i in range(orders.size):
+                E[m, i] += n(Y[:, j, :] - y[:, i, j, :]) ** 2
+
+    E = np.sqrt(E) / np.maximum(np.sqrt(np.amax(E, axis=1)), np.spacing(1))[:, np.newaxis]
+
+    return orders, E
+
+
+def morscore(orders, errors):
+    """ Model order reduction score """
+
+    nx = np.asarray(orders, dtype=float) / np.amax(orders)
+    ny = np.log10(np.asarray(errors) + np.spacing(1)) / math.floor(math.log10(np.spacing(1)))
+
+    return max(0.0, np.sum(np.diff(nx) * 0.5 * (ny[1:] + ny[:-1])))
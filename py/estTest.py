@@ -0,0 +1,65 @@
+"""
+  project: emgr ( https://gramian.de )
+  version: 5.8.py (2020-05-01)
+  authors: Christian Himpe (0000-0003-2194-6754)
+  license: BSD-2-Clause License (opensource.org/licenses/BSD-2-Clause)
+  summary: estTest (Minimal est test script)
+"""
+
+import numpy as np
+import emgr as em
+from emgr import emgr
+from est import assess, morscore
+
+
+M = 4
+N = 16
+
+A = -2.0 * np.eye(N) + np.eye(N, k=1) + np.eye(N, k=-1)
+A[0, 0] = -1.0
+B = np.outer(np.arange(N) == 0, np.linspace(1.0 / M, 1.0, M))
+C = B.T
+
+def f(x,u,p,t): return A.dot(x) + B.dot(u) + p
+def g(x,u,p,t): return C.dot(x)
+
+s = (M, N, M)
+t = (0.01, 1.0)
+P = np.zeros((N, 2))
+P[:, 1] = 0.1
+
+# Balanced truncation and reduced order model assessment
+WC = emgr(f, g, s, t, "c")
+WO = emgr(f, g, s, t, "o")
+LC = np.linalg.cholesky(WC + np.sqrt(np.spacing(1)) * np.eye(N))
+LO = np.linalg.cholesky(WO + np.sqrt(np.spacing(1)) * np.eye(N))
+U, D, V = np.linalg.svd(LO.T.dot(LC))
+XL = LC.dot(V.T) / np.sqrt(D)
+XR = LO.dot(U) / np.sqrt(D)
+o, e = assess(f, g, s, t, XL, XR, P, orders=range(1, 9))
+print(e[1], morscore(o, e[1]))
+
+assert e.shape == (4, 8) and np.allclose(np.amax(e, axis=1), 1.0)
+assert e[1, -1] < 1e-3 * e[1, 0]
+assert 0.0 < morscore(o, e[1]) <= 1.0
+
+# Per-column evaluation matches the batch
+assert np.allclose(assess(f, g, s, t, XL, XR, P, orders=range(1, 9), batch=False)[1], e)
+
+# Batched trial orders match separately simulated reduced order models
+ur = np.random.RandomState(1009).rand(int(t[1] / t[0]) + 1)
+def u(k): return np.full(M, ur[int(np.floor(k / t[0]))])
+
+l = np.zeros(len(o))
+for p in P.T:
+    Y = em.ODE(f, g, t, np.zeros(N), u, p)
+    for i, n in enumerate(o):
+        xl = XL[:, :n]
+        xr = XR[:, :n].T
+        y = em.ODE(lambda x,u,p,t: xr.dot(f(xl.dot(x), u, p, t)),
+                   lambda x,u,p,t: g(xl.dot(x), u, p, t), t, np.zeros(n), u, p)
+        l[i] += t[0] * np.linalg.norm(Y - y) ** 2
+
+assert np.allclose(np.sqrt(l / np.amax(l)), e[1])
+
+print("estTest: passed")